@@ -1,4 +1,5 @@
 # app.py
+import io
 import streamlit as st
 import pandas as pd
 import plotly.express as px
@@ -20,8 +21,148 @@ page = st.sidebar.selectbox("Navigation", PAGES)
 def money(x):
     return f"${x:,.2f}"
 
-# Load data
-df = db.fetch_expenses()
+# Cached loaders take db.data_version() as their first argument; it changes
+# on every write in this process, so cached reads never go stale
+@st.cache_data(ttl=600)
+def load_expenses(version, start=None, end=None, categories=None, search=None, columns=None):
+    # `version` is only part of the cache key
+    return db.fetch_expenses(start=start, end=end, categories=categories, search=search, columns=columns)
+
+@st.cache_data(ttl=600)
+def load_date_bounds(version):
+    return db.fetch_date_bounds()
+
+@st.cache_data(ttl=600)
+def load_categories(version):
+    return db.fetch_categories()
+
+@st.cache_data(ttl=600)
+def export_csv(version, start=None, end=None, categories=None, search=None):
+    filtered = load_expenses(version, start=start, end=end, categories=categories, search=search)
+    buf = io.BytesIO()
+    filtered.to_csv(buf, index=False, float_format="%.2f", date_format="%Y-%m-%d")
+    return buf.getvalue()
+
+@st.cache_data(ttl=600)
+def load_monthly(version, start, end):
+    return db.fetch_monthly(start=start, end=end)
+
+@st.cache_data(ttl=600)
+def load_weekly(version, start, end):
+    return db.fetch_weekly(start=start, end=end)
+
+@st.cache_data(ttl=600)
+def load_category_totals(version, start, end):
+    return db.fetch_category_totals(start=start, end=end)
+
+# ---------- DASHBOARD SECTIONS ----------
+# The Dashboard never shows ids, notes or timestamps
+DASHBOARD_COLUMNS = ('amount', 'category', 'date')
+
+# Upper bound on bars shipped to the browser per time-series chart
+MAX_MONTHS = 24
+MAX_WEEKS = 12
+
+# Figure builders are pure functions of the small aggregated frames, so cache them
+@st.cache_data(ttl=600)
+def make_monthly_fig(monthly_df, title):
+    fig = px.bar(monthly_df, x='label', y='amount', title=title, labels={'label':'Month','amount':'Amount'})
+    fig.update_layout(xaxis_tickangle=-45)
+    return fig
+
+@st.cache_data(ttl=600)
+def make_weekly_fig(weekly_df):
+    return px.bar(weekly_df, x='label', y='amount', title=f"Weekly spending (last {MAX_WEEKS} weeks)", labels={'label':'Week','amount':'Amount'})
+
+@st.cache_data(ttl=600)
+def make_category_pie(cat_df):
+    return px.pie(cat_df, names='category', values='amount', title="Spending by Category (pie)", hole=0.4)
+
+@st.cache_data(ttl=600)
+def make_category_bar(cat_df):
+    return px.bar(cat_df, x='category', y='amount', title="Spending by Category (bar)")
+
+def render_kpis(df_filtered, start, end):
+    total = df_filtered['amount'].sum()
+    last_30_days = load_expenses(
+        db.data_version(), start=end - pd.Timedelta(days=30), end=end, columns=DASHBOARD_COLUMNS
+    )['amount'].sum()
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Total", money(total))
+    col2.metric("Last 30 days", money(last_30_days))
+    col3.metric("Records", f"{len(df_filtered)}")
+
+def render_monthly(start, end):
+    # Prepare monthly series (aggregated in SQLite)
+    monthly = load_monthly(db.data_version(), start, end)
+    if monthly.empty:
+        st.info("Not enough data range to create monthly chart.")
+    else:
+        title = "Monthly spending"
+        if len(monthly) > MAX_MONTHS:
+            monthly = monthly.tail(MAX_MONTHS)
+            title = f"Monthly spending (last {MAX_MONTHS} months)"
+        fig_month = make_monthly_fig(monthly, title)
+        st.plotly_chart(fig_month, use_container_width=True, key="monthly_chart")
+
+def render_weekly(start, end):
+    # Weekly (last 12 weeks)
+    weekly = load_weekly(db.data_version(), start, end)
+    if not weekly.empty:
+        fig_week = make_weekly_fig(weekly.tail(MAX_WEEKS))
+        st.plotly_chart(fig_week, use_container_width=True, key="weekly_chart")
+
+def render_categories(start, end):
+    # Category breakdown
+    cat_df = load_category_totals(db.data_version(), start, end)
+    c1, c2 = st.columns(2)
+    if not cat_df.empty:
+        fig_pie = make_category_pie(cat_df)
+        c1.plotly_chart(fig_pie, use_container_width=True, key="category_pie")
+
+        fig_bar = make_category_bar(cat_df)
+        c2.plotly_chart(fig_bar, use_container_width=True, key="category_bar")
+    else:
+        st.info("No category data available in the selected timeframe.")
+
+# The timeframe widgets live inside the fragment, so changing them reruns
+# only the dashboard body instead of the whole script.
+@st.fragment
+def render_dashboard(min_date, max_date):
+    min_ts, max_ts = pd.Timestamp(min_date), pd.Timestamp(max_date)
+    # Timeframe selection
+    timeframe = st.selectbox("Timeframe", ["Last 30 days", "Last 90 days", "Year to date", "All time", "Custom range"])
+    if timeframe == "Custom range":
+        dr = st.date_input("Select range", value=(min_ts.date(), max_ts.date()))
+        start = pd.Timestamp(dr[0])
+        end = pd.Timestamp(dr[1])
+    else:
+        end = max_ts
+        if timeframe == "Last 30 days":
+            start = end - pd.Timedelta(days=30)
+        elif timeframe == "Last 90 days":
+            start = end - pd.Timedelta(days=90)
+        elif timeframe == "Year to date":
+            start = pd.Timestamp(year=end.year, month=1, day=1)
+        else:
+            start = min_ts
+
+    df_filtered = load_expenses(db.data_version(), start=start, end=end, columns=DASHBOARD_COLUMNS)
+    render_kpis(df_filtered, start, end)
+
+    st.markdown("---")
+    # Time series: Monthly and Weekly
+    ts_col1, ts_col2 = st.columns([2,1])
+    with ts_col1:
+        render_monthly(start, end)
+    with ts_col2:
+        render_weekly(start, end)
+
+    st.markdown("---")
+    render_categories(start, end)
+
+# Data is loaded per page, so pages that don't need it (Settings) skip the DB
 
 # ---------- ADD EXPENSE ----------
 if page == "Add Expense":
@@ -42,103 +183,41 @@ if page == "Add Expense":
         else:
             db.add_expense(amount=amount, category=category, date_str=date_input, notes=notes)
             st.success(f"Added expense: {money(amount)} — {category} on {date_input.isoformat()}")
-            # reload df
-            df = db.fetch_expenses()
 
 # ---------- VIEW & EXPORT ----------
 elif page == "View & Export":
     st.header("View and export expenses")
-    if df.empty:
+    min_date, max_date = load_date_bounds(db.data_version())
+    if min_date is None:
         st.info("No expenses recorded yet. Add one on the 'Add Expense' page.")
     else:
         # Filters
-        min_date = df['date'].min().date()
-        max_date = df['date'].max().date()
         date_range = st.date_input("Date range", value=(min_date, max_date))
         start_dt, end_dt = date_range if isinstance(date_range, (list, tuple)) else (min_date, max_date)
-        cats = sorted(df['category'].unique().tolist())
+        cats = load_categories(db.data_version())
         selected_cats = st.multiselect("Categories", options=cats, default=cats)
         text_search = st.text_input("Search notes/description (contains)")
 
-        filtered = df.copy()
-        # convert start_dt/end_dt to timestamps
-        filtered = filtered[(filtered['date'] >= pd.to_datetime(start_dt)) & (filtered['date'] <= pd.to_datetime(end_dt))]
-        if selected_cats:
-            filtered = filtered[filtered['category'].isin(selected_cats)]
-        if text_search:
-            filtered = filtered[filtered['notes'].astype(str).str.contains(text_search, case=False, na=False)]
+        # filtering happens in SQLite
+        filters = dict(start=start_dt, end=end_dt, categories=tuple(selected_cats), search=text_search)
+        filtered = load_expenses(db.data_version(), **filters)
 
         st.subheader(f"{len(filtered)} records found")
-        st.dataframe(filtered.sort_values(by=['date','created_at'], ascending=[False, False]).reset_index(drop=True))
+        # already newest-first from SQL (ORDER BY date DESC, created_at DESC)
+        st.dataframe(filtered)
 
         # Export
-        csv = filtered.to_csv(index=False).encode('utf-8')
+        csv = export_csv(db.data_version(), **filters)
         st.download_button("📥 Download CSV", data=csv, file_name="expenses_export.csv", mime="text/csv")
 
 # ---------- DASHBOARD ----------
 elif page == "Dashboard":
     st.header("Analytics Dashboard")
-    if df.empty:
+    min_date, max_date = load_date_bounds(db.data_version())
+    if min_date is None:
         st.info("No data — add some expenses to see analytics.")
     else:
-        # Timeframe selection
-        timeframe = st.selectbox("Timeframe", ["Last 30 days", "Last 90 days", "Year to date", "All time", "Custom range"])
-        if timeframe == "Custom range":
-            dr = st.date_input("Select range", value=(df['date'].min().date(), df['date'].max().date()))
-            start = pd.to_datetime(dr[0])
-            end = pd.to_datetime(dr[1])
-        else:
-            end = pd.to_datetime(df['date'].max())
-            if timeframe == "Last 30 days":
-                start = end - pd.Timedelta(days=30)
-            elif timeframe == "Last 90 days":
-                start = end - pd.Timedelta(days=90)
-            elif timeframe == "Year to date":
-                start = pd.Timestamp(year=end.year, month=1, day=1)
-            else:
-                start = pd.to_datetime(df['date'].min())
-
-        df_filtered = df[(df['date'] >= start) & (df['date'] <= end)].copy()
-        total = df_filtered['amount'].sum()
-        last_30_days = df[(df['date'] >= (pd.to_datetime(end) - pd.Timedelta(days=30))) & (df['date'] <= end)]['amount'].sum()
-
-        col1, col2, col3 = st.columns(3)
-        col1.metric("Total", money(total))
-        col2.metric("Last 30 days", money(last_30_days))
-        col3.metric("Records", f"{len(df_filtered)}")
-
-        st.markdown("---")
-        # Time series: Monthly and Weekly
-        ts_col1, ts_col2 = st.columns([2,1])
-        # Prepare monthly series
-        monthly = df_filtered.set_index('date').resample('M')['amount'].sum().reset_index()
-        if monthly.empty:
-            st.info("Not enough data range to create monthly chart.")
-        else:
-            monthly['label'] = monthly['date'].dt.strftime('%Y-%m')
-            fig_month = px.bar(monthly, x='label', y='amount', title="Monthly spending", labels={'label':'Month','amount':'Amount'})
-            fig_month.update_layout(xaxis_tickangle=-45)
-            ts_col1.plotly_chart(fig_month, use_container_width=True)
-
-        # Weekly (last 12 weeks)
-        weekly = df_filtered.set_index('date').resample('W-MON')['amount'].sum().reset_index()
-        if not weekly.empty:
-            weekly['label'] = weekly['date'].dt.strftime('%Y-%W')
-            fig_week = px.bar(weekly.tail(12), x='label', y='amount', title="Weekly spending (last 12 weeks)", labels={'label':'Week','amount':'Amount'})
-            ts_col2.plotly_chart(fig_week, use_container_width=True)
-
-        st.markdown("---")
-        # Category breakdown
-        cat_df = df_filtered.groupby('category', as_index=False)['amount'].sum().sort_values('amount', ascending=False)
-        c1, c2 = st.columns(2)
-        if not cat_df.empty:
-            fig_pie = px.pie(cat_df, names='category', values='amount', title="Spending by Category (pie)", hole=0.4)
-            c1.plotly_chart(fig_pie, use_container_width=True)
-
-            fig_bar = px.bar(cat_df, x='category', y='amount', title="Spending by Category (bar)")
-            c2.plotly_chart(fig_bar, use_container_width=True)
-        else:
-            st.info("No category data available in the selected timeframe.")
+        render_dashboard(min_date, max_date)
 
 # ---------- SETTINGS ----------
 elif page == "Settings":
@@ -146,7 +225,7 @@ elif page == "Settings":
     st.write("This area is for optional tools and production tips.")
     if st.button("Add demo data (60 random rows)"):
         db.add_demo_data()
-        st.success("Demo data added. Refresh the app to see it.")
+        st.success("Demo data added.")
     st.markdown("""
     **Production notes**
     - For a real deployment use a networked DB (Postgres/Supabase) — SQLite is file-based and ephemeral on some hosts.
@@ -2,7 +2,8 @@
 import sqlite3
 import pandas as pd
 import os
-from datetime import datetime, date
+import threading
+from datetime import datetime, date, timedelta
 
 BASE_DIR = os.path.dirname(__file__)
 DB_DIR = os.path.join(BASE_DIR, "data")
@@ -11,26 +12,154 @@ DB_PATH = os.path.join(DB_DIR, "expenses.db")
 def _ensure_db_dir():
     os.makedirs(DB_DIR, exist_ok=True)
 
+_ensure_db_dir()
+
+# One long-lived connection per database file, opened on first use.
+# Streamlit runs each session in its own thread, so every use of a shared
+# connection (statements and transaction boundaries) happens under _LOCK.
+_CONNS = {}
+_LOCK = threading.RLock()
+
+# Process-wide write counter; readers use it as a cache key so every
+# session sees writes made by any other session
+_DATA_VERSION = 0
+
+def data_version():
+    return _DATA_VERSION
+
+def _bump_data_version():
+    global _DATA_VERSION
+    _DATA_VERSION += 1
+
 def get_conn(path=DB_PATH):
-    _ensure_db_dir()
     conn = sqlite3.connect(path, check_same_thread=False)
     return conn
 
+def _get_shared_conn(path=DB_PATH):
+    with _LOCK:
+        conn = _CONNS.get(path)
+        if conn is None:
+            conn = get_conn(path)
+            conn.executescript("""
+                PRAGMA journal_mode=WAL;
+                PRAGMA synchronous=normal;
+                PRAGMA temp_store=memory;
+                PRAGMA cache_size=-64000;
+            """)
+            # Unicode-aware case folding for the non-FTS search path
+            # (SQLite's own LIKE/lower() only fold ASCII)
+            conn.create_function("casefold", 1, _casefold, deterministic=True)
+            _CONNS[path] = conn
+        return conn
+
+def _casefold(value):
+    return value.casefold() if isinstance(value, str) else value
+
+# Bump when the on-disk schema changes; tracked via PRAGMA user_version
+SCHEMA_VERSION = 2
+EPOCH = date(1970, 1, 1)
+
+_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS expenses (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        amount REAL NOT NULL,
+        category TEXT NOT NULL,
+        date INTEGER NOT NULL,        -- days since 1970-01-01
+        notes TEXT,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+# v0 stored date as 'YYYY-MM-DD' TEXT; copy rows over as day numbers
+_MIGRATE_V0 = """
+    INSERT INTO expenses (id, amount, category, date, notes, created_at)
+    SELECT id, amount, category,
+           CAST(julianday(date) - julianday('1970-01-01') AS INTEGER),
+           notes, created_at
+    FROM expenses_v0;
+    DROP TABLE expenses_v0;
+"""
+
+_INDEX_DDL = """
+    CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses(date);
+    CREATE INDEX IF NOT EXISTS idx_expenses_category ON expenses(category);
+"""
+
+# Full-text index over notes; trigram tokens keep substring ("contains") semantics.
+# Only created when the SQLite build supports it (FTS5 + trigram, SQLite >= 3.34).
+_FTS_DDL = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS expenses_fts
+    USING fts5(notes, content='expenses', content_rowid='id', tokenize='trigram');
+    CREATE TRIGGER IF NOT EXISTS expenses_fts_ai AFTER INSERT ON expenses BEGIN
+        INSERT INTO expenses_fts(rowid, notes) VALUES (new.id, new.notes);
+    END;
+    CREATE TRIGGER IF NOT EXISTS expenses_fts_ad AFTER DELETE ON expenses BEGIN
+        INSERT INTO expenses_fts(expenses_fts, rowid, notes) VALUES ('delete', old.id, old.notes);
+    END;
+    CREATE TRIGGER IF NOT EXISTS expenses_fts_au AFTER UPDATE ON expenses BEGIN
+        INSERT INTO expenses_fts(expenses_fts, rowid, notes) VALUES ('delete', old.id, old.notes);
+        INSERT INTO expenses_fts(rowid, notes) VALUES (new.id, new.notes);
+    END;
+"""
+
+# Paths whose schema has already been checked in this process
+_INITIALIZED = set()
+# Paths with a usable expenses_fts index
+_FTS_PATHS = set()
+
+def _fts_supported(conn):
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.fts_probe USING fts5(x, tokenize='trigram')")
+    except sqlite3.OperationalError:
+        return False
+    conn.execute("DROP TABLE temp.fts_probe")
+    return True
+
 def init_db(path=DB_PATH):
-    conn = get_conn(path)
-    cur = conn.cursor()
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS expenses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            amount REAL NOT NULL,
-            category TEXT NOT NULL,
-            date TEXT NOT NULL,           -- stored as 'YYYY-MM-DD'
-            notes TEXT,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP
-        );
-    """)
-    conn.commit()
-    conn.close()
+    if path in _INITIALIZED:
+        return
+    with _LOCK:
+        conn = _get_shared_conn(path)
+        # PRAGMA table_info rows are (cid, name, type, notnull, default, pk);
+        # empty when the table does not exist yet
+        column_types = {row[1]: row[2].upper() for row in conn.execute("PRAGMA table_info(expenses)")}
+        has_table = bool(column_types)
+
+        script = _TABLE_DDL
+        # decide from the actual column type, not user_version, so the v0 copy
+        # can never run twice over dates that are already day numbers
+        if column_types.get("date") == "TEXT":
+            script = "ALTER TABLE expenses RENAME TO expenses_v0;" + script + _MIGRATE_V0
+        script += _INDEX_DDL
+        use_fts = _fts_supported(conn)
+        if use_fts:
+            has_fts = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'expenses_fts'"
+            ).fetchone() is not None
+            script += _FTS_DDL
+            if has_table and not has_fts:
+                # index rows written before the FTS table existed
+                script += "INSERT INTO expenses_fts(expenses_fts) VALUES ('rebuild');"
+        # all DDL in one round trip and one transaction; a failure part way
+        # through (e.g. during the v0 copy) must not leave a half-migrated schema
+        try:
+            conn.executescript(f"BEGIN; {script} PRAGMA user_version = {SCHEMA_VERSION}; COMMIT;")
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        if use_fts:
+            _FTS_PATHS.add(path)
+        _INITIALIZED.add(path)
+
+def _day_number(value):
+    """
+    value: 'YYYY-MM-DD' or a datetime/date object -> days since 1970-01-01
+    """
+    if isinstance(value, datetime):
+        value = value.date()
+    elif isinstance(value, str):
+        value = date.fromisoformat(value)
+    return (value - EPOCH).days
 
 def add_expense(amount, category, date_str, notes=None, path=DB_PATH):
     """
@@ -38,41 +167,186 @@ def add_expense(amount, category, date_str, notes=None, path=DB_PATH):
     category: str
     date_str: 'YYYY-MM-DD' or a datetime/date object
     """
-    if isinstance(date_str, (date, datetime)):
-        date_str = date_str.strftime("%Y-%m-%d")
-    conn = get_conn(path)
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO expenses (amount, category, date, notes) VALUES (?, ?, ?, ?)",
-        (float(amount), category, date_str, notes)
-    )
-    conn.commit()
-    conn.close()
+    conn = _get_shared_conn(path)
+    with _LOCK:
+        # commits on success, rolls back on error
+        with conn:
+            conn.execute(
+                "INSERT INTO expenses (amount, category, date, notes) VALUES (?, ?, ?, ?)",
+                (float(amount), category, _day_number(date_str), notes)
+            )
+        _bump_data_version()
+
+def _where(start=None, end=None, categories=None, search=None, fts=False):
+    """
+    Builds a ' WHERE ...' clause (or '') and its parameters for the expense filters.
+    fts: search through the expenses_fts index instead of scanning notes
+    """
+    clauses, params = [], []
+    if start is not None:
+        clauses.append("date >= ?")
+        params.append(_day_number(start))
+    if end is not None:
+        clauses.append("date <= ?")
+        params.append(_day_number(end))
+    if categories:
+        categories = list(categories)
+        clauses.append(f"category IN ({','.join('?' * len(categories))})")
+        params.extend(categories)
+    if search and fts and len(search) >= 3:
+        clauses.append("id IN (SELECT rowid FROM expenses_fts WHERE expenses_fts MATCH ?)")
+        params.append('"' + search.replace('"', '""') + '"')
+    elif search:
+        # no FTS index, or too short for trigram lookups; fall back to a scan
+        clauses.append("instr(casefold(notes), ?) > 0")
+        params.append(search.casefold())
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    return where, params
+
+# Columns fetch_expenses can project, in table order
+COLUMNS = ("id", "amount", "category", "date", "notes", "created_at")
+# Rows per read_sql_query chunk in fetch_expenses
+FETCH_CHUNKSIZE = 5000
 
-def fetch_expenses(path=DB_PATH):
+def fetch_expenses(start=None, end=None, categories=None, search=None, columns=None, path=DB_PATH):
     """
     Returns a pandas DataFrame with columns:
-    id, amount, category, date (datetime64[ns]), notes, created_at
+    id, amount, category (categorical), date (datetime64[ns]), notes (string[pyarrow]), created_at
+
+    start/end: inclusive date bounds ('YYYY-MM-DD' or date/datetime objects)
+    categories: only keep these categories (ignored if empty)
+    search: case-insensitive substring match on notes
+    columns: subset of COLUMNS to select (default: all)
     """
-    conn = get_conn(path)
-    df = pd.read_sql_query("SELECT * FROM expenses ORDER BY date DESC, created_at DESC", conn)
-    conn.close()
-    if not df.empty:
-        df['date'] = pd.to_datetime(df['date'])
+    columns = list(columns) if columns else list(COLUMNS)
+    unknown = set(columns) - set(COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown expense columns: {sorted(unknown)}")
+    where, params = _where(start, end, categories, search, fts=path in _FTS_PATHS)
+    conn = _get_shared_conn(path)
+    # Read in chunks so the raw object columns only ever exist for one chunk at a time
+    with _LOCK:
+        chunks = [
+            _convert_chunk(chunk)
+            for chunk in pd.read_sql_query(
+                f"SELECT {', '.join(columns)} FROM expenses{where} ORDER BY date DESC, created_at DESC",
+                conn, params=params, chunksize=FETCH_CHUNKSIZE
+            )
+        ]
+    df = pd.concat(chunks, ignore_index=True) if chunks else _convert_chunk(pd.DataFrame(columns=columns))
+    # few distinct values: store as integer codes (after concat, so categories are shared)
+    if 'category' in df:
+        df['category'] = df['category'].astype('category')
+    return df
+
+def _convert_chunk(df):
+    # convert even when empty so callers always get a datetime column
+    if 'date' in df:
+        df['date'] = pd.to_datetime(df['date'], unit='D')
+    # Arrow-backed strings (pyarrow ships with streamlit) for compact, vectorized .str ops
+    if 'notes' in df:
+        df['notes'] = df['notes'].astype('string[pyarrow]')
     return df
 
+def fetch_date_bounds(path=DB_PATH):
+    """
+    Returns (min_date, max_date) as datetime.date objects, or (None, None) if there are no expenses.
+    """
+    conn = _get_shared_conn(path)
+    with _LOCK:
+        lo, hi = conn.execute("SELECT MIN(date), MAX(date) FROM expenses").fetchone()
+    if lo is None:
+        return None, None
+    return EPOCH + timedelta(days=lo), EPOCH + timedelta(days=hi)
+
+def fetch_categories(path=DB_PATH):
+    """
+    Returns the sorted list of categories that have at least one expense.
+    """
+    conn = _get_shared_conn(path)
+    with _LOCK:
+        return [row[0] for row in conn.execute("SELECT DISTINCT category FROM expenses ORDER BY category")]
+
+def fetch_monthly(start=None, end=None, path=DB_PATH):
+    """
+    Returns a DataFrame with columns label ('YYYY-MM') and amount, oldest month first.
+    Months without expenses between the first and last one are included with amount 0.
+    """
+    where, params = _where(start, end)
+    conn = _get_shared_conn(path)
+    # month_idx = year * 12 + (month - 1), so consecutive months are consecutive integers
+    with _LOCK:
+        monthly = pd.read_sql_query(f"""
+            SELECT CAST(strftime('%Y', date * 86400, 'unixepoch') AS INTEGER) * 12
+                   + CAST(strftime('%m', date * 86400, 'unixepoch') AS INTEGER) - 1 AS month_idx,
+                   SUM(amount) AS amount
+            FROM expenses{where}
+            GROUP BY month_idx
+            ORDER BY month_idx
+        """, conn, params=params)
+    if not monthly.empty:
+        months = range(int(monthly['month_idx'].iloc[0]), int(monthly['month_idx'].iloc[-1]) + 1)
+        monthly = monthly.set_index('month_idx').reindex(months, fill_value=0).rename_axis('month_idx').reset_index()
+    monthly['label'] = [f"{m // 12:04d}-{m % 12 + 1:02d}" for m in monthly['month_idx']]
+    return monthly[['label', 'amount']]
+
+def fetch_weekly(start=None, end=None, path=DB_PATH):
+    """
+    Returns a DataFrame with columns label ('YYYY-WW') and amount, oldest week first.
+    Weeks run Tuesday-Monday and are labelled by their closing Monday; weeks
+    without expenses between the first and last one are included with amount 0.
+    """
+    where, params = _where(start, end)
+    conn = _get_shared_conn(path)
+    # 1970-01-01 was a Thursday, so (date + 3) % 7 is the weekday with Monday = 0
+    with _LOCK:
+        weekly = pd.read_sql_query(f"""
+            SELECT date + (7 - (date + 3) % 7) % 7 AS week_end, SUM(amount) AS amount
+            FROM expenses{where}
+            GROUP BY week_end
+            ORDER BY week_end
+        """, conn, params=params)
+    if not weekly.empty:
+        weeks = range(int(weekly['week_end'].iloc[0]), int(weekly['week_end'].iloc[-1]) + 1, 7)
+        weekly = weekly.set_index('week_end').reindex(weeks, fill_value=0).rename_axis('week_end').reset_index()
+    weekly['label'] = pd.to_datetime(weekly['week_end'], unit='D').dt.strftime('%Y-%W')
+    return weekly[['label', 'amount']]
+
+def fetch_category_totals(start=None, end=None, path=DB_PATH):
+    """
+    Returns a DataFrame with columns category and amount, largest total first.
+    """
+    where, params = _where(start, end)
+    conn = _get_shared_conn(path)
+    with _LOCK:
+        return pd.read_sql_query(f"""
+            SELECT category, SUM(amount) AS amount
+            FROM expenses{where}
+            GROUP BY category
+            ORDER BY amount DESC
+        """, conn, params=params)
+
 # Optional helper to add demo data (call manually)
 def add_demo_data(path=DB_PATH):
     import random
-    import pandas as pd
     init_db(path)
     categories = ["Housing", "Food", "Transportation", "Utilities", "Entertainment", "Healthcare", "Other"]
     today = datetime.today()
-    for i in range(60):
-        d = (today - pd.Timedelta(days=random.randint(0, 365))).date()
-        add_expense(
-            amount=round(random.uniform(5, 800), 2),
-            category=random.choice(categories),
-            date_str=d.strftime("%Y-%m-%d"),
-            notes="Demo expense"
+    rows = [
+        (
+            round(random.uniform(5, 800), 2),
+            random.choice(categories),
+            _day_number(today - timedelta(days=random.randint(0, 365))),
+            "Demo expense",
         )
+        for _ in range(60)
+    ]
+    conn = _get_shared_conn(path)
+    # single transaction -> one commit for the whole batch
+    with _LOCK:
+        with conn:
+            conn.executemany(
+                "INSERT INTO expenses (amount, category, date, notes) VALUES (?, ?, ?, ?)",
+                rows
+            )
+        _bump_data_version()